@@ -5,38 +5,26 @@ from PIL import Image
 import plotly.graph_objects as go
 import plotly.express as px
 import time, os
+import tempfile
+import threading
 import base64
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from inference import SPACE_REPO_ID, API_NAME, CLASS_NAMES, parse_space_output
 
 # =========================
 # CONFIG (hardcoded values)
 # =========================
-SPACE_REPO_ID = "PavanKumarD/Fish_Image_Classification"
-API_NAME = "/predict"
 APP_TITLE = "AquaScan AI - Fish Image Classification"
 APP_ICON = "🐟"
 
-# =========================
-# EXACT TRAINING MAPPING
-# =========================
-label_mapping = {
-    'animal fish bass': 0,
-    'fish sea_food trout': 1,
-    'fish sea_food striped_red_mullet': 2,
-    'fish sea_food shrimp': 3,
-    'fish sea_food red_mullet': 4,
-    'fish sea_food red_sea_bream': 5,
-    'fish sea_food gilt_head_bream': 6,
-    'animal fish': 7,
-    'fish sea_food black_sea_sprat': 8,
-    'fish sea_food hourse_mackerel': 9,
-    'fish sea_food sea_bass': 10
-}
-
-# Build an index -> label list in correct order
-CLASS_NAMES = [None] * len(label_mapping)
-for name, idx in label_mapping.items():
-    CLASS_NAMES[idx] = name
-NUM_CLASSES = len(CLASS_NAMES)
+# Background warm-up / keep-alive for the Space
+KEEPALIVE_INTERVAL_SEC = 300   # seconds between keep-alive probes (0 disables keep-alive)
+KEEPALIVE_HOURS = (8, 20)      # hours [start, end) in KEEPALIVE_TIMEZONE to keep the Space warm; None = always
+KEEPALIVE_TIMEZONE = "UTC"     # IANA zone of the team's business hours, e.g. "Asia/Kolkata" (not the server's clock)
+WARMUP_IMAGE_SIZE = 32         # side of the synthetic probe image in pixels
+WARMUP_PANEL_REFRESH_SEC = 5   # how often the sidebar warm-up panel re-reads the state
 
 # =========================
 # Enhanced Styling
@@ -282,6 +270,105 @@ def get_client(space_repo_id: str):
 
 client, client_err = get_client(SPACE_REPO_ID)
 
+# =========================
+# Background warm-up & keep-alive
+# =========================
+def probe_backend(client) -> float:
+    """Send a tiny synthetic image through the endpoint and return the latency in ms"""
+    fd, tmp = tempfile.mkstemp(prefix="_tmp_warmup_", suffix=".png")
+    with os.fdopen(fd, "wb") as f:
+        Image.new("RGB", (WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE), (0, 105, 148)).save(f, format="PNG")
+    try:
+        start = time.perf_counter()
+        client.predict(image=handle_file(tmp), api_name=API_NAME)
+        return (time.perf_counter() - start) * 1000.0
+    finally:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+
+def within_keepalive_hours(now=None) -> bool:
+    if KEEPALIVE_HOURS is None:
+        return True
+    start, end = KEEPALIVE_HOURS
+    hour = (now or datetime.now(ZoneInfo(KEEPALIVE_TIMEZONE))).hour
+    if start <= end:
+        return start <= hour < end
+    # Window wraps past midnight, e.g. (20, 6)
+    return hour >= start or hour < end
+
+def _warmup_loop(client, state: dict, lock: threading.Lock):
+    while True:
+        with lock:
+            state["status"] = "probing" if state["warm"] else "warming"
+        try:
+            latency_ms = probe_backend(client)
+            with lock:
+                state.update(status="warm", warm=True, last_latency_ms=latency_ms,
+                             last_probe_at=time.time(), last_error=None)
+        except Exception as e:
+            with lock:
+                state.update(status="error", last_error=str(e))
+
+        if KEEPALIVE_INTERVAL_SEC <= 0:
+            return
+        time.sleep(KEEPALIVE_INTERVAL_SEC)
+        while not within_keepalive_hours():
+            with lock:
+                state["status"] = "paused"
+            time.sleep(60)
+
+@st.cache_resource
+def start_backend_warmup(_client):
+    """Start one warm-up/keep-alive thread per server process"""
+    state = {"status": "pending", "warm": False, "last_latency_ms": None,
+             "last_probe_at": None, "last_error": None}
+    lock = threading.Lock()
+    threading.Thread(target=_warmup_loop, args=(_client, state, lock),
+                     name="backend-warmup", daemon=True).start()
+    return state, lock
+
+def get_warmup_status() -> dict:
+    if not client:
+        return {}
+    state, lock = start_backend_warmup(client)
+    with lock:
+        return dict(state)
+
+if client:
+    start_backend_warmup(client)
+
+@st.fragment(run_every=WARMUP_PANEL_REFRESH_SEC)
+def render_warmup_panel():
+    """Sidebar warm-up panel; reruns on its own so the state never goes stale"""
+    warmup = get_warmup_status()
+    warmup_labels = {
+        "pending": "⏳ Warm-up scheduled",
+        "warming": "⏳ Warming up...",
+        "probing": "🔄 Keep-alive probe running",
+        "warm": "🔥 Warm",
+        "paused": "💤 Keep-alive paused (outside hours)",
+        "error": "⚠️ Last probe failed",
+    }
+    if warmup.get("last_latency_ms") is not None:
+        ago = int(time.time() - warmup["last_probe_at"])
+        latency_text = f"{warmup['last_latency_ms']:.0f} ms ({ago}s ago)"
+    else:
+        latency_text = "—"
+    keepalive_text = f"every {KEEPALIVE_INTERVAL_SEC}s" if KEEPALIVE_INTERVAL_SEC > 0 else "disabled"
+    st.markdown(f"""
+    <div class="glass-card">
+        <div style="color: rgba(255,255,255,0.8); font-size: 0.9rem;">
+            <strong>Warm-up:</strong> {warmup_labels.get(warmup.get("status"), "—")}<br>
+            <strong>Last probe:</strong> {latency_text}<br>
+            <strong>Keep-alive:</strong> {keepalive_text}
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+    if warmup.get("status") == "error" and warmup.get("last_error"):
+        st.code(warmup["last_error"])
+
 # Enhanced sidebar
 with st.sidebar:
     st.markdown("""
@@ -300,6 +387,8 @@ with st.sidebar:
             </div>
         </div>
         """, unsafe_allow_html=True)
+
+        render_warmup_panel()
     else:
         st.error("❌ Connection Failed")
         if client_err:
@@ -330,11 +419,6 @@ with st.sidebar:
 # =========================
 # Enhanced Helpers
 # =========================
-def idx_to_label(idx: int) -> str:
-    if 0 <= idx < NUM_CLASSES:
-        return CLASS_NAMES[idx]
-    return f"Class-{idx}"
-
 def create_enhanced_confidence_chart(label: str, confidence_pct: float, title: str = "Confidence", color_scheme="blue"):
     """Create a beautiful confidence visualization"""
     
@@ -451,36 +535,6 @@ def create_model_comparison_chart(resnet_conf: float, mobilenet_conf: float):
     
     return fig
 
-def parse_space_output(result: dict):
-    """Parse the output from the Space"""
-    per = {}
-    for name in ("ResNet18", "MobileNetV2"):
-        data = result.get(name, {})
-        idx = int(data.get("predicted_class", -1))
-        conf = float(data.get("confidence", 0.0))
-        per[name] = {"idx": idx, "label": idx_to_label(idx), "conf": conf}
-    
-    r18 = per["ResNet18"]
-    mv2 = per["MobileNetV2"]
-    
-    # Majority vote; on tie pick higher-confidence model
-    if r18["idx"] == mv2["idx"] and r18["idx"] != -1:
-        ens_idx = r18["idx"]
-        ens_conf = (r18["conf"] + mv2["conf"]) / 2.0
-        note = "Consensus (both models agree)"
-    else:
-        if r18["conf"] >= mv2["conf"]:
-            ens_idx, ens_conf = r18["idx"], r18["conf"]
-            note = "Split vote — ResNet18 selected (higher confidence)"
-        else:
-            ens_idx, ens_conf = mv2["idx"], mv2["conf"]
-            note = "Split vote — MobileNetV2 selected (higher confidence)"
-    
-    return {
-        "per_model": per,
-        "ensemble": {"idx": ens_idx, "label": idx_to_label(ens_idx), "conf": ens_conf, "note": note}
-    }
-
 # =========================
 # Enhanced Upload & Inference UI
 # =========================
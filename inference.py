@@ -0,0 +1,69 @@
+# inference.py — Shared Space config, label mapping and output parsing
+# Used by both the Streamlit UI (app.py) and headless ingestion (ingest.py)
+
+# =========================
+# CONFIG (hardcoded values)
+# =========================
+SPACE_REPO_ID = "PavanKumarD/Fish_Image_Classification"
+API_NAME = "/predict"
+
+# =========================
+# EXACT TRAINING MAPPING
+# =========================
+label_mapping = {
+    'animal fish bass': 0,
+    'fish sea_food trout': 1,
+    'fish sea_food striped_red_mullet': 2,
+    'fish sea_food shrimp': 3,
+    'fish sea_food red_mullet': 4,
+    'fish sea_food red_sea_bream': 5,
+    'fish sea_food gilt_head_bream': 6,
+    'animal fish': 7,
+    'fish sea_food black_sea_sprat': 8,
+    'fish sea_food hourse_mackerel': 9,
+    'fish sea_food sea_bass': 10
+}
+
+# Build an index -> label list in correct order
+CLASS_NAMES = [None] * len(label_mapping)
+for name, idx in label_mapping.items():
+    CLASS_NAMES[idx] = name
+NUM_CLASSES = len(CLASS_NAMES)
+
+# =========================
+# Helpers
+# =========================
+def idx_to_label(idx: int) -> str:
+    if 0 <= idx < NUM_CLASSES:
+        return CLASS_NAMES[idx]
+    return f"Class-{idx}"
+
+def parse_space_output(result: dict):
+    """Parse the output from the Space"""
+    per = {}
+    for name in ("ResNet18", "MobileNetV2"):
+        data = result.get(name, {})
+        idx = int(data.get("predicted_class", -1))
+        conf = float(data.get("confidence", 0.0))
+        per[name] = {"idx": idx, "label": idx_to_label(idx), "conf": conf}
+    
+    r18 = per["ResNet18"]
+    mv2 = per["MobileNetV2"]
+    
+    # Majority vote; on tie pick higher-confidence model
+    if r18["idx"] == mv2["idx"] and r18["idx"] != -1:
+        ens_idx = r18["idx"]
+        ens_conf = (r18["conf"] + mv2["conf"]) / 2.0
+        note = "Consensus (both models agree)"
+    else:
+        if r18["conf"] >= mv2["conf"]:
+            ens_idx, ens_conf = r18["idx"], r18["conf"]
+            note = "Split vote — ResNet18 selected (higher confidence)"
+        else:
+            ens_idx, ens_conf = mv2["idx"], mv2["conf"]
+            note = "Split vote — MobileNetV2 selected (higher confidence)"
+    
+    return {
+        "per_model": per,
+        "ensemble": {"idx": ens_idx, "label": idx_to_label(ens_idx), "conf": ens_conf, "note": note}
+    }
@@ -0,0 +1,419 @@
+# ingest.py — Headless folder ingestion for unlabelled fish images
+#
+# Scans (or watches) a directory tree and streams every image through
+#   read → preprocess → batched inference on the Space → ensemble vote
+# appending one JSONL record per image. Progress is checkpointed after every
+# batch so a restart resumes where it left off.
+#
+# Usage:
+#   python ingest.py /mnt/boat_photos --output results.jsonl --workers 4
+#   python ingest.py /mnt/boat_photos --output results.jsonl --watch --poll-interval 60
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from gradio_client import Client, handle_file
+from PIL import Image, ImageOps
+
+from inference import SPACE_REPO_ID, API_NAME, parse_space_output
+
+# =========================
+# CONFIG (defaults, overridable from the command line)
+# =========================
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_SIDE = 512         # longest image side sent to the Space, in pixels
+DEFAULT_POLL_INTERVAL = 30     # seconds between scans in --watch mode
+DEFAULT_CLOCK_SKEW = 300       # seconds the file server's clock may lag behind this host
+DEFAULT_MAX_ATTEMPTS = 3       # tries per image before a transient failure is recorded as final
+DEFAULT_OUTAGE_BATCHES = 3     # consecutive batches with nothing through the Space before stopping
+
+# Per-image outcome reported by a worker
+OK = "ok"                    # classified; record is written
+BAD = "bad"                  # unreadable image data; error record is written, never retried
+RETRY = "retry"              # transient read failure; retried up to --max-attempts times
+SPACE_ERROR = "space_error"  # submit/inference failed; retried like RETRY
+GONE = "gone"                # file disappeared before it was read; nothing is written
+
+class BackendUnavailable(Exception):
+    """Several batches in a row got nothing through the Space, e.g. it is asleep or unreachable"""
+
+# =========================
+# Directory scanning
+# =========================
+def path_key(rel_path: str) -> tuple:
+    """Sort key matching the order in which iter_images() yields paths"""
+    return tuple(rel_path.split("/"))
+
+def changed_time(st: os.stat_result) -> float:
+    # ctime catches files copied in with a preserved (old) mtime
+    return max(st.st_mtime, st.st_ctime)
+
+def iter_images(root: str, rel_dir: str = ""):
+    """Lazily yield (relative path, change time) for images under root, in path_key order.
+
+    Each directory listing is sorted in memory, so memory grows with the
+    largest single directory (not with the whole tree). Directories and files
+    that vanish or become unreadable during the walk are reported and skipped.
+    """
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError as e:
+        print(f"Skipping directory {rel_dir or '.'}: {e}", file=sys.stderr)
+        return
+    for entry in entries:
+        rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir:
+                if not (entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)):
+                    continue
+                changed = changed_time(entry.stat())
+        except OSError as e:
+            print(f"Skipping {rel}: {e}", file=sys.stderr)
+            continue
+        if is_dir:
+            yield from iter_images(root, rel)
+        else:
+            yield rel, changed
+
+def pending_images(root: str, checkpoint: dict, retry: set, clock_skew: float):
+    """Yield images to process in the current pass: earlier retries first, then the scan.
+
+    The scan takes images changed in (since - clock_skew, pass_started]; newer
+    ones are left for the next pass. Images in the skew overlap that the
+    previous pass already handled are skipped by (path, change time).
+    """
+    yield from sorted(retry, key=path_key)
+
+    since = checkpoint["since"]
+    lower = since - clock_skew if since is not None else None
+    upper = checkpoint["pass_started"]
+    previous = checkpoint["previous"]
+    last_key = path_key(checkpoint["last_path"]) if checkpoint["last_path"] else None
+    for rel, changed in iter_images(root):
+        if rel in retry or changed > upper:
+            continue
+        if lower is not None and changed <= lower:
+            continue
+        if previous.get(rel) == changed:
+            continue
+        if last_key is not None and path_key(rel) <= last_key:
+            continue
+        yield rel
+
+def batched(iterable, size: int):
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+# =========================
+# Checkpointing
+# =========================
+# A checkpoint means: every image changed at or before `since` has been
+# processed (allowing for clock skew, see pending_images), and so has every
+# image up to and including `last_path` in the pass that started at
+# `pass_started`, except those listed in `retry` (path → failed attempts).
+# `recent` / `previous` hold (path → change time) of images processed inside
+# the skew overlap.
+def load_checkpoint(path: str) -> dict:
+    checkpoint = {"source": None, "since": None, "pass_started": None, "last_path": None,
+                  "recent": {}, "previous": {}, "retry": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint.update(json.load(f))
+    return checkpoint
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# =========================
+# Worker process
+# =========================
+_client = None
+_space_repo_id = SPACE_REPO_ID
+_max_side = DEFAULT_MAX_SIDE
+
+def init_worker(space_repo_id: str, max_side: int):
+    global _space_repo_id, _max_side
+    _space_repo_id = space_repo_id
+    _max_side = max_side
+
+def get_worker_client():
+    """Connect lazily and reuse the client for every batch of this process"""
+    global _client
+    if _client is None:
+        _client = Client(_space_repo_id, verbose=False)
+    return _client
+
+def decode(data: bytes) -> Image.Image:
+    """Decode, orient and downscale an image; failures here mean bad image data"""
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((_max_side, _max_side))
+    return img
+
+def write_temp_png(img: Image.Image) -> str:
+    fd, tmp = tempfile.mkstemp(prefix="_tmp_ingest_", suffix=".png")
+    with os.fdopen(fd, "wb") as f:
+        img.save(f, format="PNG")
+    return tmp
+
+def build_record(rel: str, parsed: dict, timings: dict) -> dict:
+    ens = parsed["ensemble"]
+    return {
+        "path": rel,
+        "label": ens["label"],
+        "idx": ens["idx"],
+        "confidence": ens["conf"],
+        "note": ens["note"],
+        "per_model": parsed["per_model"],
+        "timings_ms": {k: round(v, 1) for k, v in timings.items()},
+    }
+
+def process_batch(root: str, batch: list) -> list:
+    """Run one batch of images; all Space jobs of the batch are in flight together.
+
+    Returns one (status, change time, record) tuple per image, in batch order.
+    """
+    results = {}
+    try:
+        client = get_worker_client()
+    except Exception as e:
+        error = f"cannot connect to {_space_repo_id}: {e}"
+        return [(SPACE_ERROR, None, {"path": rel, "error": error}) for rel in batch]
+
+    jobs = []
+    for rel in batch:
+        path = os.path.join(root, rel)
+        try:
+            changed = changed_time(os.stat(path))
+            t0 = time.perf_counter()
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            results[rel] = (GONE, None, {"path": rel})
+            continue
+        except OSError as e:
+            results[rel] = (RETRY, None, {"path": rel, "error": str(e)})
+            continue
+
+        t1 = time.perf_counter()
+        try:
+            img = decode(data)
+        except Exception as e:
+            results[rel] = (BAD, changed, {"path": rel, "error": f"invalid image: {e}"})
+            continue
+        finally:
+            del data
+
+        tmp = None
+        try:
+            tmp = write_temp_png(img)
+            t2 = time.perf_counter()
+            job = client.submit(image=handle_file(tmp), api_name=API_NAME)
+            timings = {"read": (t1 - t0) * 1000.0, "preprocess": (t2 - t1) * 1000.0}
+            jobs.append((rel, changed, tmp, job, t2, timings))
+        except Exception as e:
+            results[rel] = (SPACE_ERROR, changed, {"path": rel, "error": str(e)})
+            if tmp:
+                os.remove(tmp)
+
+    for rel, changed, tmp, job, submitted, timings in jobs:
+        try:
+            raw = job.result()
+            # Jobs are awaited in order, so later ones include time queued behind earlier ones
+            timings["queue_and_inference"] = (time.perf_counter() - submitted) * 1000.0
+            timings["total"] = sum(timings.values())
+            results[rel] = (OK, changed, build_record(rel, parse_space_output(raw), timings))
+        except Exception as e:
+            results[rel] = (SPACE_ERROR, changed, {"path": rel, "error": str(e)})
+        finally:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+
+    return [results[rel] for rel in batch]
+
+# =========================
+# Pipeline
+# =========================
+def run_pass(executor, args, checkpoint: dict) -> int:
+    """Process every pending image once; return the number of records written"""
+    if checkpoint["pass_started"] is None:
+        checkpoint.update(pass_started=time.time(), last_path=None, recent={})
+
+    retry = dict(checkpoint["retry"])
+    retry_snapshot = frozenset(retry)
+    overlap_start = checkpoint["pass_started"] - args.clock_skew
+
+    # Bounded window of in-flight batches: only the current directory listing
+    # and this window are held in memory, and results are committed in scan
+    # order so the checkpoint only ever advances over a contiguous prefix.
+    window = deque()
+    max_in_flight = args.workers * 2
+    # Consecutive batches where nothing got through the Space. They are only
+    # committed (as retries) once a later batch succeeds or the pass ends, so
+    # an outage neither advances the checkpoint nor uses up retry attempts.
+    held = []
+    written = 0
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        def commit(batch, results):
+            nonlocal written
+            for status, changed, record in results:
+                rel = record["path"]
+                if status in (RETRY, SPACE_ERROR):
+                    attempts = retry.pop(rel, 0) + 1
+                    if attempts < args.max_attempts:
+                        retry[rel] = attempts
+                        print(f"Will retry {rel} (attempt {attempts}/{args.max_attempts}): "
+                              f"{record['error']}", file=sys.stderr)
+                        continue
+                    record = {"path": rel, "error": f"gave up after {attempts} attempts: {record['error']}"}
+                    print(f"Giving up on {rel}: {record['error']}", file=sys.stderr)
+                else:
+                    retry.pop(rel, None)
+                    if status == GONE:
+                        continue
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += 1
+                if changed is not None and changed > overlap_start:
+                    checkpoint["recent"][rel] = changed
+            out.flush()
+            os.fsync(out.fileno())
+
+            scanned = [rel for rel in batch if rel not in retry_snapshot]
+            if scanned:
+                checkpoint["last_path"] = scanned[-1]
+            checkpoint["retry"] = {rel: retry[rel] for rel in sorted(retry, key=path_key)}
+            save_checkpoint(args.checkpoint, checkpoint)
+
+        def commit_held():
+            while held:
+                commit(*held.pop(0))
+
+        def commit_oldest():
+            batch, future = window.popleft()
+            results = future.result()
+            statuses = [status for status, _, _ in results]
+            if SPACE_ERROR in statuses and OK not in statuses:
+                held.append((batch, results))
+                if len(held) >= args.outage_batches:
+                    raise BackendUnavailable(next(record["error"] for status, _, record in results
+                                                  if status == SPACE_ERROR))
+                return
+            commit_held()
+            commit(batch, results)
+
+        pending = pending_images(args.source, checkpoint, retry_snapshot, args.clock_skew)
+        for batch in batched(pending, args.batch_size):
+            window.append((batch, executor.submit(process_batch, args.source, batch)))
+            if len(window) >= max_in_flight:
+                commit_oldest()
+        while window:
+            commit_oldest()
+        commit_held()
+
+    # Keep every entry the next pass's skew overlap can still reach
+    seen = {**checkpoint["previous"], **checkpoint["recent"]}
+    previous = {rel: changed for rel, changed in seen.items() if changed > overlap_start}
+    checkpoint.update(since=checkpoint["pass_started"], pass_started=None, last_path=None,
+                      previous=previous, recent={})
+    save_checkpoint(args.checkpoint, checkpoint)
+    return written
+
+def ingest(args, checkpoint: dict) -> int:
+    """Run passes until done (or forever in --watch mode)"""
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(args.space, args.max_side))
+    try:
+        while True:
+            start = time.perf_counter()
+            written = run_pass(executor, args, checkpoint)
+            elapsed = time.perf_counter() - start
+            if written:
+                print(f"Processed {written} images in {elapsed:.1f}s "
+                      f"({written / elapsed:.2f} img/s) → {args.output}", file=sys.stderr)
+            if not args.watch:
+                return 0
+            time.sleep(args.poll_interval)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a folder of fish images into a JSONL file.")
+    parser.add_argument("source", help="directory tree to ingest")
+    parser.add_argument("-o", "--output", default="predictions.jsonl", help="JSONL file to append records to")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.ckpt.json)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="number of worker processes")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="images per inference batch")
+    parser.add_argument("--max-side", type=int, default=DEFAULT_MAX_SIDE, help="downscale images to this longest side")
+    parser.add_argument("--space", default=SPACE_REPO_ID, help="Hugging Face Space to query")
+    parser.add_argument("--watch", action="store_true", help="keep rescanning the directory for new images")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="seconds between scans in --watch mode")
+    parser.add_argument("--clock-skew", type=float, default=DEFAULT_CLOCK_SKEW,
+                        help="seconds the source file server's clock may lag behind this host")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="tries per image before a transient failure is recorded as final")
+    parser.add_argument("--outage-batches", type=int, default=DEFAULT_OUTAGE_BATCHES,
+                        help="consecutive batches with nothing through the Space before stopping")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        parser.error(f"not a directory: {args.source}")
+    if args.workers < 1 or args.batch_size < 1:
+        parser.error("--workers and --batch-size must be at least 1")
+    if args.max_side < 1 or args.poll_interval < 1:
+        parser.error("--max-side and --poll-interval must be at least 1")
+    if args.max_attempts < 1 or args.outage_batches < 1:
+        parser.error("--max-attempts and --outage-batches must be at least 1")
+    if args.clock_skew < 0:
+        parser.error("--clock-skew must not be negative")
+    args.source = os.path.abspath(args.source)
+    args.checkpoint = args.checkpoint or f"{args.output}.ckpt.json"
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    checkpoint = load_checkpoint(args.checkpoint)
+    if checkpoint["source"] is None:
+        checkpoint["source"] = args.source
+    elif checkpoint["source"] != args.source:
+        print(f"Checkpoint {args.checkpoint} belongs to {checkpoint['source']}, not {args.source}; "
+              f"use a different --output or --checkpoint", file=sys.stderr)
+        return 2
+    save_checkpoint(args.checkpoint, checkpoint)
+
+    try:
+        while True:
+            try:
+                return ingest(args, checkpoint)
+            except (BackendUnavailable, BrokenProcessPool) as e:
+                print(f"Space {args.space} unavailable ({str(e) or 'worker pool crashed'}); "
+                      f"progress saved to {args.checkpoint}", file=sys.stderr)
+                if not args.watch:
+                    return 1
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        print(f"Interrupted; progress saved to {args.checkpoint}", file=sys.stderr)
+        return 130
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# test_ingest.py — Checkpoint and failure handling of the folder ingestion pipeline
+# Run with: python -m pytest test_ingest.py
+import json
+import shutil
+import sys
+import time
+import types
+from concurrent.futures import Future
+
+import pytest
+from PIL import Image
+
+# The Space is never contacted: a fake gradio_client decides per image
+# (by its red channel) whether inference succeeds; the threshold tolerates JPEG loss.
+FAIL_RED = 255
+
+class FakeJob:
+    def __init__(self, path):
+        self.path = path
+
+    def result(self):
+        with Image.open(self.path) as img:
+            if img.convert("RGB").getpixel((0, 0))[0] > FAIL_RED - 30:
+                raise ConnectionError("Space rejected the image")
+        return {"ResNet18": {"predicted_class": 3, "confidence": 0.9},
+                "MobileNetV2": {"predicted_class": 3, "confidence": 0.7}}
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, image, api_name):
+        return FakeJob(image)
+
+sys.modules["gradio_client"] = types.SimpleNamespace(Client=FakeClient, handle_file=lambda path: path)
+
+import ingest  # noqa: E402
+
+class InlineExecutor:
+    """Runs batches synchronously in this process"""
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+@pytest.fixture(autouse=True)
+def fresh_worker():
+    ingest._client = None
+    ingest._max_side = ingest.DEFAULT_MAX_SIDE
+
+@pytest.fixture
+def src(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    return root
+
+def add_image(root, rel, fail=False):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (8, 8), (FAIL_RED if fail else 0, 100, 150)).save(path)
+    return path
+
+def make_args(src, tmp_path, *extra):
+    return ingest.parse_args([str(src), "-o", str(tmp_path / "out.jsonl"), "-w", "1", *extra])
+
+def read_paths(args):
+    with open(args.output, encoding="utf-8") as f:
+        return [json.loads(line)["path"] for line in f]
+
+def run(args, checkpoint):
+    return ingest.run_pass(InlineExecutor(), args, checkpoint)
+
+def test_resume_mid_pass_skips_committed_prefix(src, tmp_path):
+    for rel in ("a/1.png", "a/2.png", "b/3.png", "c.png"):
+        add_image(src, rel)
+    args = make_args(src, tmp_path)
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+    checkpoint.update(pass_started=time.time(), last_path="a/2.png")
+
+    assert run(args, checkpoint) == 2
+    assert read_paths(args) == ["b/3.png", "c.png"]
+    assert checkpoint["pass_started"] is None and checkpoint["last_path"] is None
+
+def test_clock_skew_overlap_is_not_reprocessed(src, tmp_path):
+    add_image(src, "1.png")
+    add_image(src, "2.png")
+    args = make_args(src, tmp_path, "--clock-skew", "3600")
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+
+    assert run(args, checkpoint) == 2
+    assert set(checkpoint["previous"]) == {"1.png", "2.png"}
+    assert run(args, checkpoint) == 0
+    # An empty pass must keep the overlap entries for the pass after it
+    assert run(args, checkpoint) == 0
+    assert read_paths(args) == ["1.png", "2.png"]
+
+def test_files_changed_after_pass_started_wait_for_next_pass(src, tmp_path):
+    add_image(src, "a.png")
+    args = make_args(src, tmp_path)
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+    checkpoint["pass_started"] = time.time()
+    time.sleep(0.05)
+    add_image(src, "b.png")
+
+    assert run(args, checkpoint) == 1
+    assert run(args, checkpoint) == 1
+    assert run(args, checkpoint) == 0
+    assert read_paths(args) == ["a.png", "b.png"]
+
+def test_failed_image_is_retried_then_recorded(src, tmp_path):
+    add_image(src, "a.png")
+    flaky = add_image(src, "b.png", fail=True)
+    args = make_args(src, tmp_path)
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+
+    assert run(args, checkpoint) == 1
+    assert checkpoint["retry"] == {"b.png": 1}
+    assert ingest.load_checkpoint(args.checkpoint)["retry"] == {"b.png": 1}
+
+    Image.new("RGB", (8, 8), (0, 0, 0)).save(flaky)
+    assert run(args, checkpoint) == 1
+    assert checkpoint["retry"] == {}
+    assert read_paths(args) == ["a.png", "b.png"]
+    assert run(args, checkpoint) == 0
+
+def test_retries_are_capped(src, tmp_path):
+    add_image(src, "a.png")
+    add_image(src, "b.png", fail=True)
+    args = make_args(src, tmp_path, "--max-attempts", "2")
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+
+    run(args, checkpoint)
+    run(args, checkpoint)
+    assert checkpoint["retry"] == {}
+    with open(args.output, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["path"] for r in records] == ["a.png", "b.png"]
+    assert records[1]["error"].startswith("gave up after 2 attempts")
+    assert run(args, checkpoint) == 0
+
+def test_always_rejected_image_does_not_block_later_images(src, tmp_path):
+    add_image(src, "a/1.png")
+    add_image(src, "b/4.jpg", fail=True)
+    add_image(src, "c/5.png")
+    args = make_args(src, tmp_path, "-b", "1")
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+
+    assert run(args, checkpoint) == 2
+    assert read_paths(args) == ["a/1.png", "c/5.png"]
+    assert checkpoint["retry"] == {"b/4.jpg": 1}
+
+def test_outage_stops_without_advancing_checkpoint(src, tmp_path):
+    for i in range(4):
+        add_image(src, f"{i}.png", fail=True)
+    args = make_args(src, tmp_path, "-b", "1", "--outage-batches", "3")
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+
+    with pytest.raises(ingest.BackendUnavailable, match="rejected"):
+        run(args, checkpoint)
+    assert checkpoint["last_path"] is None
+    assert checkpoint["retry"] == {}
+    assert read_paths(args) == []
+
+def test_gone_file_in_failed_batch_does_not_crash(src, tmp_path):
+    add_image(src, "b.png", fail=True)
+    args = make_args(src, tmp_path, "-b", "2", "--outage-batches", "1")
+    checkpoint = ingest.load_checkpoint(args.checkpoint)
+    checkpoint["retry"] = {"a_deleted.png": 1, "b.png": 1}
+
+    with pytest.raises(ingest.BackendUnavailable, match="rejected"):
+        run(args, checkpoint)
+
+def test_vanished_directory_is_skipped(src):
+    add_image(src, "a/1.png")
+    add_image(src, "b/2.png")
+    walk = ingest.iter_images(str(src))
+
+    assert next(walk)[0] == "a/1.png"
+    shutil.rmtree(src / "b")
+    assert list(walk) == []